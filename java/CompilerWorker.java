@@ -0,0 +1,73 @@
+import java.io.BufferedInputStream;
+import java.io.BufferedOutputStream;
+import java.io.ByteArrayOutputStream;
+import java.io.DataInputStream;
+import java.io.DataOutputStream;
+import java.io.EOFException;
+import java.io.IOException;
+import java.nio.charset.StandardCharsets;
+import javax.tools.JavaCompiler;
+import javax.tools.ToolProvider;
+
+/**
+ * Long-lived javac host used by main.py so the API never forks javac per request.
+ *
+ * Every frame is a 4-byte big-endian length followed by that many UTF-8 bytes.
+ * Request:  job count (int), then per job an argument count (int) followed by
+ *           one frame per javac argument.
+ * Response: per job, in order and flushed as soon as that job finishes:
+ *           exit code (int), captured stdout frame, captured stderr frame.
+ */
+public final class CompilerWorker {
+
+    public static void main(String[] args) throws IOException {
+        JavaCompiler compiler = ToolProvider.getSystemJavaCompiler();
+        if (compiler == null) {
+            System.err.println("No system Java compiler available (JRE instead of JDK?)");
+            System.exit(2);
+        }
+
+        DataInputStream in = new DataInputStream(new BufferedInputStream(System.in));
+        DataOutputStream out = new DataOutputStream(new BufferedOutputStream(System.out));
+
+        while (true) {
+            int jobs;
+            try {
+                jobs = in.readInt();
+            } catch (EOFException e) {
+                return;
+            }
+            String[][] batch = new String[jobs][];
+            for (int j = 0; j < jobs; j++) {
+                String[] javacArgs = new String[in.readInt()];
+                for (int i = 0; i < javacArgs.length; i++) {
+                    javacArgs[i] = readFrame(in);
+                }
+                batch[j] = javacArgs;
+            }
+
+            // Each job is its own javac task so snippets never share a namespace
+            for (String[] javacArgs : batch) {
+                ByteArrayOutputStream stdout = new ByteArrayOutputStream();
+                ByteArrayOutputStream stderr = new ByteArrayOutputStream();
+                int code = compiler.run(null, stdout, stderr, javacArgs);
+
+                out.writeInt(code);
+                writeFrame(out, stdout.toByteArray());
+                writeFrame(out, stderr.toByteArray());
+                out.flush();
+            }
+        }
+    }
+
+    static String readFrame(DataInputStream in) throws IOException {
+        byte[] data = new byte[in.readInt()];
+        in.readFully(data);
+        return new String(data, StandardCharsets.UTF_8);
+    }
+
+    static void writeFrame(DataOutputStream out, byte[] data) throws IOException {
+        out.writeInt(data.length);
+        out.write(data);
+    }
+}
@@ -0,0 +1,217 @@
+import java.io.BufferedInputStream;
+import java.io.BufferedOutputStream;
+import java.io.ByteArrayInputStream;
+import java.io.ByteArrayOutputStream;
+import java.io.DataInputStream;
+import java.io.DataOutputStream;
+import java.io.EOFException;
+import java.io.FileDescriptor;
+import java.io.FileInputStream;
+import java.io.FileOutputStream;
+import java.io.IOException;
+import java.io.InputStream;
+import java.io.PrintStream;
+import java.lang.reflect.InvocationTargetException;
+import java.lang.reflect.Method;
+import java.lang.reflect.Modifier;
+import java.net.URL;
+import java.net.URLClassLoader;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Paths;
+import java.util.Arrays;
+import java.util.Collections;
+import java.util.IdentityHashMap;
+import java.util.Locale;
+import java.util.Properties;
+import java.util.Set;
+import java.util.TimeZone;
+
+/**
+ * Long-lived JVM that runs compiled snippets in a fresh class loader, so the
+ * API never forks java per request. Handles one snippet at a time; main.py
+ * enforces the timeout by killing the whole worker.
+ *
+ * Frames are the same as CompilerWorker's.
+ * Request:  class directory frame, main class frame, stdin frame.
+ * Response: exit code (int), captured stdout frame, captured stderr frame,
+ *           recycle flag (int, 1 when this worker should be replaced, e.g.
+ *           because the snippet changed system properties, locale or timezone).
+ */
+public final class RunnerWorker {
+
+    // Replace the worker if live heap after a run stays above this share of -Xmx
+    private static final double HEAP_WATERMARK = 0.75;
+
+    public static void main(String[] args) throws IOException {
+        // Keep the real pipes for the protocol; snippets only see the redirected System streams
+        DataInputStream in = new DataInputStream(new BufferedInputStream(new FileInputStream(FileDescriptor.in)));
+        DataOutputStream out = new DataOutputStream(new BufferedOutputStream(new FileOutputStream(FileDescriptor.out)));
+        InputStream realIn = System.in;
+        PrintStream realOut = System.out;
+        PrintStream realErr = System.err;
+
+        while (true) {
+            String classDir;
+            try {
+                classDir = CompilerWorker.readFrame(in);
+            } catch (EOFException e) {
+                return;
+            }
+            String mainClass = CompilerWorker.readFrame(in);
+            byte[] stdin = CompilerWorker.readFrame(in).getBytes(StandardCharsets.UTF_8);
+
+            ByteArrayOutputStream stdout = new ByteArrayOutputStream();
+            ByteArrayOutputStream stderr = new ByteArrayOutputStream();
+            ThreadGroup group = new ThreadGroup("snippet");
+            JvmDefaults defaults = JvmDefaults.capture();
+            int code;
+            System.setIn(new ByteArrayInputStream(stdin));
+            System.setOut(new PrintStream(stdout, true, StandardCharsets.UTF_8));
+            System.setErr(new PrintStream(stderr, true, StandardCharsets.UTF_8));
+            try {
+                code = run(group, classDir, mainClass);
+            } catch (Exception e) {
+                e.printStackTrace();
+                code = 1;
+            } finally {
+                System.out.flush();
+                System.err.flush();
+                System.setIn(realIn);
+                System.setOut(realOut);
+                System.setErr(realErr);
+            }
+
+            // A snippet that changed JVM-wide defaults would leak them into the next run
+            boolean recycle = group.activeCount() > 0 || !defaults.unchanged() || overHeapWatermark();
+            out.writeInt(code);
+            CompilerWorker.writeFrame(out, stdout.toByteArray());
+            CompilerWorker.writeFrame(out, stderr.toByteArray());
+            out.writeInt(recycle ? 1 : 0);
+            out.flush();
+        }
+    }
+
+    private static int run(ThreadGroup group, String classDir, String mainClass) throws Exception {
+        URL[] classpath = {Paths.get(classDir).toUri().toURL()};
+        // Platform loader as parent: snippets see the JDK but not this worker's classes
+        try (URLClassLoader loader = new URLClassLoader(classpath, ClassLoader.getPlatformClassLoader())) {
+            Method entry;
+            try {
+                entry = Class.forName(mainClass, false, loader).getMethod("main", String[].class);
+            } catch (ClassNotFoundException | NoClassDefFoundError e) {
+                System.err.println("Error: Could not find or load main class " + mainClass);
+                return 1;
+            } catch (NoSuchMethodException e) {
+                System.err.println("Error: Main method not found in class " + mainClass);
+                return 1;
+            }
+            if (!Modifier.isStatic(entry.getModifiers())) {
+                System.err.println("Error: Main method is not static in class " + mainClass);
+                return 1;
+            }
+            // Like the java launcher, run main of a package-private class too
+            entry.setAccessible(true);
+
+            int[] exit = {0};
+            Thread thread = new Thread(group, () -> {
+                try {
+                    entry.invoke(null, (Object) new String[0]);
+                } catch (Throwable t) {
+                    Throwable cause = t instanceof InvocationTargetException ? t.getCause() : t;
+                    trimWorkerFrames(cause);
+                    System.err.print("Exception in thread \"main\" ");
+                    cause.printStackTrace();
+                    exit[0] = 1;
+                }
+            }, "main");
+            thread.setContextClassLoader(loader);
+            thread.start();
+            thread.join();
+            joinNonDaemonThreads(group);
+            return exit[0];
+        }
+    }
+
+    // Drop the reflection and worker frames below main, so traces read like the java launcher's
+    private static void trimWorkerFrames(Throwable t) {
+        Set<Throwable> seen = Collections.newSetFromMap(new IdentityHashMap<>());
+        for (; t != null && seen.add(t); t = t.getCause()) {
+            StackTraceElement[] frames = t.getStackTrace();
+            int end = frames.length;
+            while (end > 0 && isWorkerFrame(frames[end - 1].getClassName())) {
+                end--;
+            }
+            if (end > 0 && end < frames.length) {
+                t.setStackTrace(Arrays.copyOf(frames, end));
+            }
+        }
+    }
+
+    private static boolean isWorkerFrame(String className) {
+        return className.equals(RunnerWorker.class.getName())
+            || className.equals(Thread.class.getName())
+            || className.startsWith("jdk.internal.reflect.")
+            || className.startsWith("java.lang.reflect.")
+            || className.startsWith("java.lang.invoke.");
+    }
+
+    // Like JVM exit: wait for any non-daemon threads the snippet started
+    private static void joinNonDaemonThreads(ThreadGroup group) throws InterruptedException {
+        while (true) {
+            Thread[] threads = new Thread[group.activeCount() + 8];
+            int count = group.enumerate(threads, true);
+            Thread pending = null;
+            for (int i = 0; i < count && pending == null; i++) {
+                if (!threads[i].isDaemon() && threads[i].isAlive()) {
+                    pending = threads[i];
+                }
+            }
+            if (pending == null) {
+                return;
+            }
+            pending.join();
+        }
+    }
+
+    /** JVM-wide defaults a snippet can change and that later runs would observe. */
+    private static final class JvmDefaults {
+        private final Properties properties;
+        private final Locale locale;
+        private final Locale displayLocale;
+        private final Locale formatLocale;
+        private final String timeZone;
+        private final Thread.UncaughtExceptionHandler uncaughtHandler;
+
+        private JvmDefaults() {
+            properties = (Properties) System.getProperties().clone();
+            locale = Locale.getDefault();
+            displayLocale = Locale.getDefault(Locale.Category.DISPLAY);
+            formatLocale = Locale.getDefault(Locale.Category.FORMAT);
+            timeZone = TimeZone.getDefault().getID();
+            uncaughtHandler = Thread.getDefaultUncaughtExceptionHandler();
+        }
+
+        static JvmDefaults capture() {
+            return new JvmDefaults();
+        }
+
+        boolean unchanged() {
+            return properties.equals(System.getProperties())
+                && locale.equals(Locale.getDefault())
+                && displayLocale.equals(Locale.getDefault(Locale.Category.DISPLAY))
+                && formatLocale.equals(Locale.getDefault(Locale.Category.FORMAT))
+                && timeZone.equals(TimeZone.getDefault().getID())
+                && uncaughtHandler == Thread.getDefaultUncaughtExceptionHandler();
+        }
+    }
+
+    private static boolean overHeapWatermark() {
+        Runtime runtime = Runtime.getRuntime();
+        long limit = (long) (runtime.maxMemory() * HEAP_WATERMARK);
+        if (runtime.totalMemory() - runtime.freeMemory() <= limit) {
+            return false;
+        }
+        System.gc();
+        return runtime.totalMemory() - runtime.freeMemory() > limit;
+    }
+}
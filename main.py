@@ -1,16 +1,144 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import subprocess
 import tempfile
 import shutil
 import os
 import re
+import struct
+import asyncio
+import math
+import resource
+import signal
+import stat
+import anyio.to_thread
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional, List, Tuple
+from typing import AsyncIterator, Awaitable, Callable, Iterator, Optional, List, Set, Tuple
+
+# Cache keys: blake3 (SIMD, optional) when installed, else OpenSSL-backed SHA-256
+try:
+    from blake3 import blake3 as _hasher
+except ImportError:
+    _hasher = hashlib.sha256
 
 app = FastAPI(title="Java Code Runner API")
 
+# Persistent javac and java workers (see java/)
+WORKER_SRC_DIR = Path(__file__).resolve().parent / "java"
+# Built per server process into a private mkdtemp, so respawned workers only ever load our classes
+WORKER_BUILD_DIR: Optional[str] = None
+COMPILER_WORKERS = max(1, os.cpu_count() or 1)
+# Explicit heap cap: the default is a quarter of RAM per worker. javac lives long, so keep C2 on.
+COMPILER_WORKER_FLAGS = ["-Xmx512m", "-XX:+UseSerialGC", "-Xshare:auto"]
+COMPILE_BATCH_MAX = 16
+COMPILE_TIMEOUT = 20
+RUNNER_WORKERS = max(1, os.cpu_count() or 1)
+RUNNER_WORKER_FLAGS = ["-Xmx256m", "-XX:TieredStopAtLevel=1", "-XX:+UseSerialGC", "-Xshare:auto"]
+RUN_TIMEOUT = 10
+
+# These touch process-wide state (exit, std streams, child processes, JVM-wide
+# defaults, the working directory), so they always get a JVM of their own in their
+# workspace instead of a shared RunnerWorker. RunnerWorker also recycles itself if a
+# run changed properties, locale or timezone.
+_FORK_ONLY_RE = re.compile(
+    r'System\s*\.\s*(?:exit|set(?:In|Out|Err)|console)|\bRuntime\b|ProcessBuilder'
+    r'|setDefault|setPropert(?:y|ies)|clearProperty|setDefaultUncaughtExceptionHandler'
+    r'|\bFile\w*|RandomAccessFile|\bPaths?\b|user\.dir'
+)
+
+# Snippets are short-lived: C1 only, serial GC and class data sharing cut JVM start-up
+JAVA_RUN_FLAGS = [
+    "-Xmx256m",
+    "-XX:TieredStopAtLevel=1",
+    "-XX:+UseSerialGC",
+    "-Xshare:auto",
+    "-XX:+DisableExplicitGC",
+]
+CDS_ARCHIVE = Path(tempfile.gettempdir()) / "java_runner.jsa"
+# Classes nearly every snippet loads, archived once at startup
+CDS_CLASSES = [
+    "java/lang/Object",
+    "java/lang/String",
+    "java/lang/StringBuilder",
+    "java/lang/Math",
+    "java/lang/Integer",
+    "java/lang/Long",
+    "java/lang/Double",
+    "java/io/PrintStream",
+    "java/io/BufferedReader",
+    "java/io/InputStreamReader",
+    "java/util/Scanner",
+    "java/util/Arrays",
+    "java/util/ArrayList",
+    "java/util/HashMap",
+    "java/util/HashSet",
+    "java/util/regex/Pattern",
+]
+JAVA_CDS_FLAGS: List[str] = []
+
+# `-version` output of javac/java, probed once at startup for /java-env
+_JAVA_ENV: dict = {}
+
+# Threads for blocking helpers; the Java work itself runs in other processes
+THREAD_POOL_SIZE = 2 * (os.cpu_count() or 1)
+
+# Concurrent compiles/runs allowed, and how many more may wait before we answer 429
+CONCURRENCY_LIMIT = max(2, os.cpu_count() or 1)
+MAX_WAITING = 4 * CONCURRENCY_LIMIT
+
+# Reusable per-request workspaces, so the hot path never creates or deletes directories
+WORKSPACE_ROOT = Path(tempfile.gettempdir()) / "java_run_pool"
+# Enough for every request the gates admit at once (compiling, plus running or
+# waiting to run), so overload is answered with 429 rather than queueing here
+WORKSPACES = 2 * CONCURRENCY_LIMIT + MAX_WAITING
+WORKSPACE_POOL: "asyncio.LifoQueue[str]" = asyncio.LifoQueue()
+
+# Kernel caps for processes running user code: no huge files, no core dumps.
+# Forked javac/java also get RLIMIT_CPU equal to their wall-clock timeout.
+FILE_SIZE_LIMIT = 16 * 1024 * 1024
+
+# Most output a streamed run may send before it is cut off
+STREAM_OUTPUT_LIMIT = 1024 * 1024
+
+# Sources up to this size are written on the event loop: a page-cache write of a
+# few KB is cheaper than the hop to a worker thread
+INLINE_WRITE_LIMIT = 64 * 1024
+
+# Compiled classes keyed by a hash of the source, like ccache. The root is private to
+# this user (0700), and the oldest entries by mtime are evicted past the cap. Snippets
+# run as the same user, so an entry is only restored if its content still matches the
+# digest this process recorded when storing it.
+COMPILE_CACHE_DIR = Path(tempfile.gettempdir()) / f"java_compile_cache_{os.getuid()}"
+COMPILE_CACHE_ENTRIES = int(os.environ.get("COMPILE_CACHE_ENTRIES", "2048"))
+COMPILE_CACHE_ENABLED = False
+COMPILE_CACHE_DIGESTS: "OrderedDict[str, str]" = OrderedDict()
+MAIN_CLASS_FILE = "main_class"
+
+# Memoized /run-java responses keyed by (code, input_data), LRU-evicted
+RESULT_CACHE_SIZE = 4096
+RESULT_CACHE: "OrderedDict[str, dict]" = OrderedDict()
+RESULT_CACHE_LOCK = asyncio.Lock()
+
+# Source-side detection, compiled once at import
+_PUBLIC_TYPE_RE = re.compile(r'public\s+(?:\w+\s+)*(class|enum|record|interface)\s+([A-Za-z_]\w*)')
+_PACKAGE_RE = re.compile(r'^\s*package\s+([\w\.]+)\s*;', re.MULTILINE)
+_TYPE_DECL_RE = re.compile(r'\b(?:class|interface|enum|record)\s+[A-Za-z_]\w*')
+_MAIN_RE = re.compile(r'public\s+static\s+void\s+main\s*\(\s*String(?:\s*\[\s*\]|\s*\.\.\.)\s*\w*\s*\)')
+
+# Snippets whose output depends on more than (code, input) are never memoized
+_NONDETERMINISTIC_RE = re.compile(
+    r'System\s*\.\s*(?:currentTimeMillis|nanoTime|getenv|getProperty)'
+    r'|Random|Socket|URL|Instant|LocalDate|LocalTime|ZonedDateTime|Clock|UUID'
+    r'|Thread|Files|File\b|\bRuntime\b'
+    r'|Math\s*\.\s*random|hashCode|identityHashCode'
+    r'|\bDate\b|Calendar|\.\s*now\s*\('
+)
+
 # CORS (production me apne domain set karo)
 app.add_middleware(
     CORSMiddleware,
@@ -24,6 +152,489 @@ class CodeRequest(BaseModel):
     code: str
     input_data: str = ""  # optional user input
 
+def _limit_files() -> None:
+    resource.setrlimit(resource.RLIMIT_FSIZE, (FILE_SIZE_LIMIT, FILE_SIZE_LIMIT))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+
+def _sandbox_limits(cpu_seconds: int) -> Callable[[], None]:
+    def apply() -> None:
+        _limit_files()
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds))
+    return apply
+
+def _kill(proc: asyncio.subprocess.Process) -> None:
+    # uvloop raises if the process already exited but hasn't been reaped yet
+    try:
+        proc.kill()
+    except ProcessLookupError:
+        pass
+
+def _kill_process_group(proc: asyncio.subprocess.Process) -> None:
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+async def run_process(
+    cmd: List[str],
+    cwd: str,
+    timeout: float,
+    input_data: Optional[str] = None,
+    sandboxed: bool = False,
+) -> Tuple[int, str, str]:
+    """
+    Runs cmd without blocking the event loop. Returns (exit_code, stdout, stderr).
+    Kills the process and re-raises asyncio.TimeoutError on timeout, and likewise
+    if the caller is cancelled or anything else interrupts the wait.
+
+    sandboxed runs user code: kernel rlimits apply, and the process gets its own
+    process group so a timeout kills anything it spawned too.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        cwd=cwd,
+        stdin=subprocess.PIPE if input_data is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        preexec_fn=_sandbox_limits(math.ceil(timeout)) if sandboxed else None,
+        start_new_session=sandboxed,
+    )
+    payload = input_data.encode("utf-8") if input_data is not None else None
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(input=payload), timeout)
+    except BaseException:
+        # Never leave it running into a workspace that goes back to the pool
+        if sandboxed:
+            _kill_process_group(proc)
+        else:
+            _kill(proc)
+        await proc.wait()
+        raise
+    return (
+        proc.returncode,
+        stdout.decode("utf-8", errors="replace"),
+        stderr.decode("utf-8", errors="replace"),
+    )
+
+def _write_frame(stream: asyncio.StreamWriter, data: bytes) -> None:
+    stream.write(struct.pack(">I", len(data)))
+    stream.write(data)
+
+async def _read_frame(stream: asyncio.StreamReader) -> bytes:
+    (length,) = struct.unpack(">I", await stream.readexactly(4))
+    return await stream.readexactly(length)
+
+class WorkerExited(RuntimeError):
+    pass
+
+class JvmWorkerPool:
+    """
+    Fixed set of long-lived JVMs speaking the framed protocol of the classes in java/.
+    """
+
+    def __init__(self, cmd: List[str], size: int, cwd: Optional[str] = None):
+        self._cmd = cmd
+        self._size = size
+        self._cwd = cwd
+        self._idle: "asyncio.Queue[asyncio.subprocess.Process]" = asyncio.Queue()
+        # Strong references: the event loop only keeps weak ones to running tasks
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _background(self, coro: Awaitable[None]) -> None:
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def start(self) -> None:
+        for _ in range(self._size):
+            self._idle.put_nowait(await self._spawn())
+
+    async def _spawn(self) -> asyncio.subprocess.Process:
+        return await asyncio.create_subprocess_exec(
+            *self._cmd,
+            cwd=self._cwd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            preexec_fn=_limit_files,
+        )
+
+    async def _replace(self, proc: asyncio.subprocess.Process) -> asyncio.subprocess.Process:
+        _kill(proc)
+        await proc.wait()
+        return await self._spawn()
+
+    async def close(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        while not self._idle.empty():
+            proc = self._idle.get_nowait()
+            if proc is None:
+                continue
+            _kill(proc)
+            await proc.wait()
+        if self._cwd:
+            await asyncio.to_thread(shutil.rmtree, self._cwd, ignore_errors=True)
+
+class CompilerWorkerPool(JvmWorkerPool):
+    """
+    CompilerWorker JVMs, so each compile is a framed round trip over
+    stdin/stdout instead of a fresh javac JVM.
+
+    Requests that queue up while every worker is busy are sent to the next free
+    worker in batches of at most a fair share of the queue; a lone request is
+    dispatched straight away. Every job in a batch has its own timeout.
+    """
+
+    def __init__(self, java_path: str, class_dir: str, size: int, timeout: float):
+        super().__init__([java_path, *COMPILER_WORKER_FLAGS, "-cp", class_dir, "CompilerWorker"], size)
+        self._timeout = timeout
+        self._pending: "asyncio.Queue[Tuple[List[str], asyncio.Future]]" = asyncio.Queue()
+        self._collector: Optional[asyncio.Task] = None
+        # Workers that could not be respawned are gone for good
+        self._live = size
+
+    async def start(self) -> None:
+        await super().start()
+        self._collector = asyncio.create_task(self._collect())
+
+    async def _collect(self) -> None:
+        while True:
+            # Worker first: a job is never held while waiting for a worker that may not come back
+            proc = await self._idle.get()
+            batch = [await self._pending.get()]
+            # Fair share of what's queued, so workers freeing up next still get work
+            share = min(COMPILE_BATCH_MAX, math.ceil((1 + self._pending.qsize()) / self._size))
+            while len(batch) < share and not self._pending.empty():
+                batch.append(self._pending.get_nowait())
+            self._background(self._dispatch(proc, batch))
+
+    async def _send(self, proc: asyncio.subprocess.Process, jobs: List[List[str]]) -> None:
+        proc.stdin.write(struct.pack(">I", len(jobs)))
+        for args in jobs:
+            proc.stdin.write(struct.pack(">I", len(args)))
+            for arg in args:
+                _write_frame(proc.stdin, arg.encode("utf-8"))
+        await proc.stdin.drain()
+
+    async def _receive(self, proc: asyncio.subprocess.Process) -> Tuple[int, str, str]:
+        (code,) = struct.unpack(">i", await proc.stdout.readexactly(4))
+        stdout = (await _read_frame(proc.stdout)).decode("utf-8", errors="replace")
+        stderr = (await _read_frame(proc.stdout)).decode("utf-8", errors="replace")
+        return code, stdout, stderr
+
+    async def _dispatch(
+        self, proc: asyncio.subprocess.Process, batch: List[Tuple[List[str], asyncio.Future]]
+    ) -> None:
+        done = 0
+        try:
+            await asyncio.wait_for(self._send(proc, [args for args, _ in batch]), self._timeout)
+            # Each job gets its own timeout; the worker replies as each one finishes
+            for _, future in batch:
+                result = await asyncio.wait_for(self._receive(proc), self._timeout)
+                if not future.done():
+                    future.set_result(result)
+                done += 1
+        except (asyncio.TimeoutError, OSError, asyncio.IncompleteReadError) as e:
+            # Timed out or died on job `done`: fail that one, then replace the worker
+            _, future = batch[done]
+            if not future.done():
+                if isinstance(e, asyncio.TimeoutError):
+                    future.set_exception(asyncio.TimeoutError())
+                else:
+                    future.set_exception(WorkerExited("Compiler worker exited unexpectedly."))
+            # Jobs behind it never ran: queue them again
+            for job in batch[done + 1:]:
+                self._pending.put_nowait(job)
+            try:
+                proc = await self._replace(proc)
+            except OSError:
+                self._live -= 1
+                if not self._live:
+                    self._fail_pending()
+                return
+        except asyncio.CancelledError:
+            _kill(proc)
+            raise
+        self._idle.put_nowait(proc)
+
+    def _fail_pending(self) -> None:
+        while not self._pending.empty():
+            _, future = self._pending.get_nowait()
+            if not future.done():
+                future.set_exception(WorkerExited("No compiler workers left."))
+
+    async def compile(self, args: List[str]) -> Tuple[int, str, str]:
+        if not self._live:
+            raise WorkerExited("No compiler workers left.")
+        future = asyncio.get_running_loop().create_future()
+        self._pending.put_nowait((args, future))
+        return await future
+
+    async def close(self) -> None:
+        if self._collector:
+            self._collector.cancel()
+        await super().close()
+
+class RunnerWorkerPool(JvmWorkerPool):
+    """
+    RunnerWorker JVMs that load each snippet in a fresh class loader, so a run
+    is one framed round trip instead of a fresh java JVM.
+
+    Workers are started lazily, up to size, and kept hot afterwards; the most
+    recently used idle worker is reused first. A killed worker is replaced in
+    the background so the next request doesn't wait for a JVM to boot; if that
+    replacement fails to start, a None placeholder wakes one waiter, which then
+    starts a worker itself.
+    """
+
+    def __init__(self, java_path: str, class_dir: str, size: int):
+        # Private scratch cwd, so relative paths never land next to main.py
+        super().__init__(
+            [java_path, *RUNNER_WORKER_FLAGS, "-cp", class_dir, "RunnerWorker"],
+            size,
+            cwd=tempfile.mkdtemp(prefix="java_runner_cwd_"),
+        )
+        self._idle: "asyncio.LifoQueue[Optional[asyncio.subprocess.Process]]" = asyncio.LifoQueue()
+        self._started = 0
+
+    async def start(self) -> None:
+        # Nothing up front: an idle server shouldn't pay for JVMs it never uses
+        pass
+
+    async def _acquire(self) -> asyncio.subprocess.Process:
+        while True:
+            if self._idle.empty() and self._started < self._size:
+                self._started += 1
+                try:
+                    return await self._spawn()
+                except OSError:
+                    self._started -= 1
+                    raise
+            proc = await self._idle.get()
+            if proc is not None:
+                return proc
+            # Placeholder from a failed refill: its slot is free, go round and spawn
+
+    async def _refill(self) -> None:
+        try:
+            self._idle.put_nowait(await self._spawn())
+        except OSError:
+            self._started -= 1
+            self._idle.put_nowait(None)
+
+    async def _retire(self, proc: asyncio.subprocess.Process) -> None:
+        _kill(proc)
+        await proc.wait()
+        self._background(self._refill())
+
+    async def _round_trip(
+        self, proc: asyncio.subprocess.Process, class_dir: str, main_class: str, input_data: str
+    ) -> Tuple[int, str, str, bool]:
+        for frame in (class_dir, main_class, input_data):
+            _write_frame(proc.stdin, frame.encode("utf-8"))
+        await proc.stdin.drain()
+        (code,) = struct.unpack(">i", await proc.stdout.readexactly(4))
+        stdout = (await _read_frame(proc.stdout)).decode("utf-8", errors="replace")
+        stderr = (await _read_frame(proc.stdout)).decode("utf-8", errors="replace")
+        (recycle,) = struct.unpack(">i", await proc.stdout.readexactly(4))
+        return code, stdout, stderr, bool(recycle)
+
+    async def run(
+        self, class_dir: str, main_class: str, input_data: str, timeout: float
+    ) -> Tuple[int, str, str]:
+        proc = await self._acquire()
+        try:
+            code, stdout, stderr, recycle = await asyncio.wait_for(
+                self._round_trip(proc, class_dir, main_class, input_data), timeout
+            )
+        except (asyncio.TimeoutError, OSError, asyncio.IncompleteReadError) as e:
+            # The snippet can't be stopped inside a shared JVM: kill the worker instead
+            await self._retire(proc)
+            if isinstance(e, asyncio.TimeoutError):
+                raise
+            raise WorkerExited("Runner worker exited unexpectedly.") from e
+        except asyncio.CancelledError:
+            # Abandoned mid-run: its late reply would desync the pipe
+            await self._retire(proc)
+            raise
+
+        if recycle:
+            await self._retire(proc)
+        else:
+            self._idle.put_nowait(proc)
+        return code, stdout, stderr
+
+COMPILER_POOL: Optional[CompilerWorkerPool] = None
+RUNNER_POOL: Optional[RunnerWorkerPool] = None
+
+class ConcurrencyGate:
+    """
+    Semaphore that answers 429 once too many requests are already waiting,
+    so overload is signalled instead of stalling connections.
+    """
+
+    def __init__(self, limit: int, max_waiting: int):
+        self._sem = asyncio.Semaphore(limit)
+        self._max_waiting = max_waiting
+        self._waiting = 0
+
+    def reserve(self) -> None:
+        """
+        Admits a request now, or answers 429, and counts it as waiting until its
+        acquire(reserved=True) or unreserve(). Work done in between is never
+        thrown away by a late 429.
+        """
+        if self._sem.locked() and self._waiting >= self._max_waiting:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many concurrent requests. Try again shortly.",
+                headers={"Retry-After": "1"},
+            )
+        self._waiting += 1
+
+    def unreserve(self) -> None:
+        self._waiting -= 1
+
+    async def acquire(self, reserved: bool = False) -> None:
+        if not reserved:
+            self.reserve()
+        try:
+            await self._sem.acquire()
+        finally:
+            self._waiting -= 1
+
+    def release(self) -> None:
+        self._sem.release()
+
+    async def __aenter__(self) -> None:
+        await self.acquire()
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.release()
+
+COMPILE_SEM = ConcurrencyGate(CONCURRENCY_LIMIT, MAX_WAITING)
+RUN_SEM = ConcurrencyGate(CONCURRENCY_LIMIT, MAX_WAITING)
+
+@app.on_event("startup")
+async def start_workers():
+    global COMPILER_POOL, RUNNER_POOL, WORKER_BUILD_DIR
+    javac_path = shutil.which("javac")
+    java_path = shutil.which("java")
+    if not javac_path or not java_path:
+        return
+
+    # Build the worker once; if that fails we fall back to forking javac
+    build_dir = tempfile.mkdtemp(prefix="java_runner_workers_")
+    sources = [str(p) for p in WORKER_SRC_DIR.glob("*.java")]
+    try:
+        code, _, _ = await run_process(
+            [javac_path, "-encoding", "UTF-8", "-d", build_dir, *sources],
+            cwd=str(WORKER_SRC_DIR),
+            timeout=60,
+        )
+    except (OSError, asyncio.TimeoutError):
+        code = -1
+    if code != 0:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        return
+    # Read-only from here on: nothing may swap or rewrite the classes under a respawning worker
+    for name in os.listdir(build_dir):
+        os.chmod(os.path.join(build_dir, name), 0o400)
+    os.chmod(build_dir, 0o500)
+    WORKER_BUILD_DIR = build_dir
+
+    pool = CompilerWorkerPool(java_path, build_dir, COMPILER_WORKERS, COMPILE_TIMEOUT)
+    await pool.start()
+    COMPILER_POOL = pool
+    runners = RunnerWorkerPool(java_path, build_dir, RUNNER_WORKERS)
+    await runners.start()
+    RUNNER_POOL = runners
+
+@app.on_event("shutdown")
+async def stop_workers():
+    for pool in (COMPILER_POOL, RUNNER_POOL):
+        if pool:
+            await pool.close()
+    if WORKER_BUILD_DIR:
+        os.chmod(WORKER_BUILD_DIR, 0o700)
+        shutil.rmtree(WORKER_BUILD_DIR, ignore_errors=True)
+
+@app.on_event("startup")
+async def limit_threads():
+    # Bounds both `def` endpoints (anyio) and asyncio.to_thread (default executor)
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREAD_POOL_SIZE
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=THREAD_POOL_SIZE, thread_name_prefix="java_runner")
+    )
+
+@app.on_event("startup")
+def create_workspaces():
+    WORKSPACE_ROOT.mkdir(parents=True, exist_ok=True)
+    for _ in range(WORKSPACES):
+        WORKSPACE_POOL.put_nowait(tempfile.mkdtemp(prefix="java_run_", dir=WORKSPACE_ROOT))
+
+@app.on_event("shutdown")
+def remove_workspaces():
+    while not WORKSPACE_POOL.empty():
+        shutil.rmtree(WORKSPACE_POOL.get_nowait(), ignore_errors=True)
+
+def clear_workspace(work_dir: str) -> None:
+    for p in Path(work_dir).iterdir():
+        if p.is_dir() and not p.is_symlink():
+            shutil.rmtree(p)
+        else:
+            p.unlink()
+
+async def release_workspace(work_dir: str) -> None:
+    try:
+        await asyncio.to_thread(clear_workspace, work_dir)
+    except OSError:
+        # Snippet left something we can't remove; retire this workspace
+        await asyncio.to_thread(shutil.rmtree, work_dir, ignore_errors=True)
+        work_dir = tempfile.mkdtemp(prefix="java_run_", dir=WORKSPACE_ROOT)
+    WORKSPACE_POOL.put_nowait(work_dir)
+
+@app.on_event("startup")
+def open_compile_cache():
+    global COMPILE_CACHE_ENABLED
+    # /tmp is world-writable: only trust a real directory we own that nobody else can write to
+    try:
+        COMPILE_CACHE_DIR.mkdir(mode=0o700, exist_ok=True)
+        st = COMPILE_CACHE_DIR.lstat()
+    except OSError:
+        return
+    COMPILE_CACHE_ENABLED = (
+        stat.S_ISDIR(st.st_mode) and st.st_uid == os.getuid() and not st.st_mode & 0o077
+    )
+
+@app.on_event("startup")
+async def build_cds_archive():
+    global JAVA_CDS_FLAGS
+    java_path = shutil.which("java")
+    if not java_path:
+        return
+
+    # Dump under a private name and rename, so concurrent server processes never see a partial archive
+    work_dir = tempfile.mkdtemp(prefix="java_cds_")
+    try:
+        class_list = os.path.join(work_dir, "classes.lst")
+        archive = os.path.join(work_dir, CDS_ARCHIVE.name)
+        _write_file(class_list, "\n".join(CDS_CLASSES) + "\n")
+        code, _, _ = await run_process(
+            [java_path, "-Xshare:dump", "-XX:+UseSerialGC",
+             f"-XX:SharedClassListFile={class_list}", f"-XX:SharedArchiveFile={archive}"],
+            cwd=work_dir,
+            timeout=60,
+        )
+        if code == 0:
+            os.replace(archive, CDS_ARCHIVE)
+            JAVA_CDS_FLAGS = [f"-XX:SharedArchiveFile={CDS_ARCHIVE}"]
+    except (OSError, asyncio.TimeoutError):
+        pass
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
 @app.get("/")
 def home():
     return {"message": "Java Runner API is live 🚀"}
@@ -32,144 +643,574 @@ def extract_public_type(code: str) -> Tuple[Optional[str], Optional[str]]:
     """
     Returns (kind, name) where kind in {class, enum, record, interface} if public type exists.
     """
-    m = re.search(r'public\s+(?:\w+\s+)*(class|enum|record|interface)\s+([A-Za-z_]\w*)', code)
+    m = _PUBLIC_TYPE_RE.search(code)
     if m:
         return m.group(1), m.group(2)
     return None, None
 
 def extract_package_name(code: str) -> Optional[str]:
-    m = re.search(r'^\s*package\s+([\w\.]+)\s*;', code, re.MULTILINE)
+    m = _PACKAGE_RE.search(code)
     return m.group(1) if m else None
 
 def code_mentions_main(code: str) -> bool:
-    return re.search(
-        r'public\s+static\s+void\s+main\s*\(\s*String(?:\s*\[\s*\]|\s*\.\.\.)\s*\w*\s*\)',
-        code
-    ) is not None
-
-def find_main_classes_with_javap(work_dir: str, javap_path: str) -> List[str]:
-    main_classes: List[str] = []
-    for class_file in Path(work_dir).rglob("*.class"):
-        if "$" in class_file.name:
+    return _MAIN_RE.search(code) is not None
+
+def declares_single_type(code: str) -> bool:
+    # Stray matches in comments/strings only make this False, i.e. fall back to scanning
+    return len(_TYPE_DECL_RE.findall(code)) == 1
+
+# Bytes following the tag of each non-Utf8 constant pool entry (JVMS 4.4)
+_CP_ENTRY_SIZES = {3: 4, 4: 4, 5: 8, 6: 8, 7: 2, 8: 2, 9: 4, 10: 4, 11: 4, 12: 4,
+                   15: 3, 16: 2, 17: 4, 18: 4, 19: 2, 20: 2}
+ACC_PUBLIC_STATIC = 0x0009
+MAIN_DESCRIPTOR = "([Ljava/lang/String;)V"
+
+def class_file_main(data: bytes) -> Optional[str]:
+    """
+    Parses a .class file. Returns its binary name if it declares
+    public static void main(String[]), else None.
+    """
+    if data[:4] != b"\xca\xfe\xba\xbe":
+        return None
+
+    # Constant pool: keep Utf8 strings and Class -> name index
+    (count,) = struct.unpack_from(">H", data, 8)
+    utf8 = {}
+    classes = {}
+    pos = 10
+    index = 1
+    while index < count:
+        tag = data[pos]
+        pos += 1
+        if tag == 1:
+            (length,) = struct.unpack_from(">H", data, pos)
+            utf8[index] = data[pos + 2:pos + 2 + length].decode("utf-8", errors="replace")
+            pos += 2 + length
+        else:
+            if tag == 7:
+                (classes[index],) = struct.unpack_from(">H", data, pos)
+            pos += _CP_ENTRY_SIZES[tag]
+        # Long and Double take two slots
+        index += 2 if tag in (5, 6) else 1
+
+    _, this_class, _, interfaces_count = struct.unpack_from(">HHHH", data, pos)
+    pos += 8 + 2 * interfaces_count
+
+    # Fields then methods share the same layout; only methods are checked
+    for is_method in (False, True):
+        (members,) = struct.unpack_from(">H", data, pos)
+        pos += 2
+        for _ in range(members):
+            flags, name_index, descriptor_index, attributes = struct.unpack_from(">HHHH", data, pos)
+            pos += 8
+            if (
+                is_method
+                and flags & ACC_PUBLIC_STATIC == ACC_PUBLIC_STATIC
+                and utf8.get(name_index) == "main"
+                and utf8.get(descriptor_index) == MAIN_DESCRIPTOR
+            ):
+                return utf8[classes[this_class]].replace("/", ".")
+            for _ in range(attributes):
+                (length,) = struct.unpack_from(">I", data, pos + 2)
+                pos += 6 + length
+    return None
+
+def iter_class_files(work_dir: str) -> Iterator[str]:
+    """
+    Yields paths of top-level .class files under work_dir (no Path objects, no extra stats).
+    """
+    stack = [work_dir]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith(".class") and "$" not in entry.name:
+                    yield entry.path
+
+def find_main_class_by_parsing(work_dir: str) -> Optional[str]:
+    """
+    Returns the binary name of the first class declaring main(String[]), if any.
+    """
+    for path in iter_class_files(work_dir):
+        try:
+            with open(path, "rb") as f:
+                binary_name = class_file_main(f.read())
+        except (OSError, struct.error, KeyError, IndexError):
             continue
-        binary_name = str(class_file.relative_to(work_dir)).replace(os.sep, ".")[:-6]
+        if binary_name:
+            return binary_name
+    return None
+
+def source_digest(*parts: str) -> str:
+    # Fed part by part, so the key never needs one concatenated copy of all inputs
+    h = _hasher()
+    for i, part in enumerate(parts):
+        if i:
+            h.update(b"\0")
+        h.update(part.encode())
+    return h.hexdigest()
+
+def result_cache_key(code: str, input_data: str) -> str:
+    return source_digest(code, input_data)
+
+async def get_cached_result(key: str) -> Optional[dict]:
+    async with RESULT_CACHE_LOCK:
+        result = RESULT_CACHE.get(key)
+        if result is None:
+            return None
+        RESULT_CACHE.move_to_end(key)
+        return dict(result)
+
+async def cache_result(key: str, result: dict) -> None:
+    async with RESULT_CACHE_LOCK:
+        RESULT_CACHE[key] = dict(result)
+        RESULT_CACHE.move_to_end(key)
+        while len(RESULT_CACHE) > RESULT_CACHE_SIZE:
+            RESULT_CACHE.popitem(last=False)
+
+def read_class_files(root: str) -> List[Tuple[str, bytes]]:
+    """
+    Returns (relative path, contents) of every .class file under root, in a stable order.
+    """
+    files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.endswith(".class"):
+                path = os.path.join(dirpath, name)
+                with open(path, "rb") as f:
+                    files.append((os.path.relpath(path, root), f.read()))
+    return files
+
+def snapshot_digest(candidate: str, files: List[Tuple[str, bytes]]) -> str:
+    h = _hasher()
+    h.update(candidate.encode())
+    for rel, data in files:
+        h.update(b"\0" + rel.encode() + b"\0")
+        h.update(data)
+    return h.hexdigest()
+
+def _write_class_files(root: str, files: List[Tuple[str, bytes]]) -> None:
+    for rel, data in files:
+        path = os.path.join(root, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _write_bytes(path, data)
+
+def restore_compiled(cache_entry: Path, work_dir: str, expected: str) -> Optional[str]:
+    """
+    Copies cached classes into work_dir if they still match the expected digest.
+    Returns the cached main class, or None on a miss.
+    """
+    try:
+        candidate = (cache_entry / MAIN_CLASS_FILE).read_text(encoding="utf-8")
+        # Verify the very bytes we copy, so nothing can be swapped in between
+        files = read_class_files(str(cache_entry / "classes"))
+        if snapshot_digest(candidate, files) != expected:
+            return None
+        _write_class_files(work_dir, files)
+        # mtime doubles as the last-use time for eviction
+        os.utime(cache_entry)
+    except OSError:
+        return None
+    return candidate
+
+def store_compiled(cache_entry: Path, work_dir: str, candidate: str) -> Optional[str]:
+    """
+    Snapshots the classes in work_dir into cache_entry; the final rename is atomic.
+    Returns the snapshot's digest, or None if nothing was stored.
+    """
+    tmp = tempfile.mkdtemp(prefix=cache_entry.name + ".", suffix=".tmp", dir=COMPILE_CACHE_DIR)
+    try:
+        files = read_class_files(work_dir)
+        _write_class_files(os.path.join(tmp, "classes"), files)
+        _write_file(os.path.join(tmp, MAIN_CLASS_FILE), candidate)
+        # An entry we have no digest for is stale or planted; ours replaces it
+        shutil.rmtree(cache_entry, ignore_errors=True)
+        os.replace(tmp, cache_entry)
+    except OSError:
+        # Another request won the race (or the disk is unhappy); just drop ours
+        shutil.rmtree(tmp, ignore_errors=True)
+        return None
+    evict_compiled()
+    return snapshot_digest(candidate, files)
+
+def remember_compiled(key: str, digest: str) -> None:
+    COMPILE_CACHE_DIGESTS[key] = digest
+    COMPILE_CACHE_DIGESTS.move_to_end(key)
+    while len(COMPILE_CACHE_DIGESTS) > COMPILE_CACHE_ENTRIES:
+        COMPILE_CACHE_DIGESTS.popitem(last=False)
+
+def evict_compiled() -> None:
+    """
+    Removes the least recently used cache entries beyond COMPILE_CACHE_ENTRIES.
+    """
+    entries = []
+    with os.scandir(COMPILE_CACHE_DIR) as it:
+        for entry in it:
+            if entry.name.endswith(".tmp"):
+                continue
+            try:
+                entries.append((entry.stat(follow_symlinks=False).st_mtime, entry.path))
+            except OSError:
+                continue
+    if len(entries) <= COMPILE_CACHE_ENTRIES:
+        return
+    entries.sort()
+    for _, path in entries[:len(entries) - COMPILE_CACHE_ENTRIES]:
+        shutil.rmtree(path, ignore_errors=True)
+
+def _write_file(path: str, data: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(data)
+
+def _write_bytes(path: str, data: bytes) -> None:
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+async def compile_java(javac_path: str, work_dir: str, filename: str) -> Tuple[int, str, str]:
+    """
+    Compiles work_dir/filename into work_dir. Returns (exit_code, stdout, stderr).
+    """
+    if COMPILER_POOL:
+        # Explicit paths: the in-process javac would otherwise see the worker's own classpath
+        args = [
+            "-encoding", "UTF-8", "-g:none", "-cp", work_dir, "-sourcepath", work_dir,
+            "-d", work_dir, os.path.join(work_dir, filename),
+        ]
         try:
-            p = subprocess.run(
-                [javap_path, "-public", "-classpath", ".", binary_name],
-                capture_output=True,
-                text=True,
-                timeout=5,
-                cwd=work_dir
-            )
-            if p.returncode == 0 and (
-                "public static void main(java.lang.String[])" in p.stdout
-                or "public static void main(java.lang.String...)" in p.stdout
-            ):
-                main_classes.append(binary_name)
-        except Exception:
+            code, stdout, stderr = await COMPILER_POOL.compile(args)
+        except WorkerExited:
+            # Worker died on this job or the pool is gone; compile in a javac of its own
             pass
-    return main_classes
+        else:
+            # Worker gets absolute paths; keep diagnostics relative like a local javac
+            prefix = work_dir + os.sep
+            return code, stdout.replace(prefix, ""), stderr.replace(prefix, "")
 
-@app.post("/run-java")
-def run_java_code(request: CodeRequest):
-    # Locate tools
+    compile_cmd = [
+        javac_path, "-encoding", "UTF-8", "-g:none", "-cp", ".", "-sourcepath", ".", "-d", ".", filename
+    ]
+    return await run_process(compile_cmd, cwd=work_dir, timeout=COMPILE_TIMEOUT, sandboxed=True)
+
+async def run_java(
+    java_path: str, work_dir: str, main_class: str, code: str, input_data: str
+) -> Tuple[int, str, str]:
+    """
+    Runs main_class from work_dir. Returns (exit_code, stdout, stderr).
+    """
+    if RUNNER_POOL and not _FORK_ONLY_RE.search(code):
+        try:
+            return await RUNNER_POOL.run(work_dir, main_class, input_data, timeout=RUN_TIMEOUT)
+        except WorkerExited:
+            # Snippet took the shared JVM down; rerun it in a JVM of its own
+            pass
+
+    run_cmd = [java_path, *JAVA_RUN_FLAGS, *JAVA_CDS_FLAGS, "-cp", ".", main_class]
+    return await run_process(
+        run_cmd, cwd=work_dir, timeout=RUN_TIMEOUT, input_data=input_data, sandboxed=True
+    )
+
+async def prepare_java(javac_path: str, work_dir: str, code: str) -> Tuple[Optional[str], Optional[dict]]:
+    """
+    Compiles code into work_dir, or restores it from the compile cache.
+    Returns (main_class, None), or (None, response) if compilation failed.
+    """
+    # Reuse classes from an earlier compile of the same source
+    cache_key = source_digest(code)
+    cache_entry = COMPILE_CACHE_DIR / cache_key
+    expected = COMPILE_CACHE_DIGESTS.get(cache_key) if COMPILE_CACHE_ENABLED else None
+    if expected:
+        candidate: Optional[str] = await asyncio.to_thread(
+            restore_compiled, cache_entry, work_dir, expected
+        )
+        if candidate is not None:
+            COMPILE_CACHE_DIGESTS.move_to_end(cache_key)
+            return candidate, None
+
+    # File name must match any public top-level type (class/enum/record/interface)
+    public_kind, public_name = extract_public_type(code)
+    filename = f"{public_name or 'Main'}.java"
+    filepath = os.path.join(work_dir, filename)
+
+    source = code.encode("utf-8")
+    if len(source) <= INLINE_WRITE_LIMIT:
+        _write_bytes(filepath, source)
+    else:
+        await asyncio.to_thread(_write_bytes, filepath, source)
+
+    # Compile
+    compile_code, compile_stdout, compile_stderr = await compile_java(javac_path, work_dir, filename)
+
+    if compile_code != 0:
+        return None, {
+            "ok": False,
+            "stage": "compile",
+            "stdout": compile_stdout,
+            "stderr": compile_stderr,
+            "output": compile_stderr,
+            "exit_code": compile_code,
+        }
+
+    package_name = extract_package_name(code)
+    public_binary = f"{package_name}.{public_name}" if package_name and public_name else public_name
+
+    if public_name and code_mentions_main(code) and declares_single_type(code):
+        # One type and it has main: the source already proves the entry point
+        candidate = public_binary
+    else:
+        # Otherwise detect main from the compiled classes (most reliable);
+        # fall back to the public type anyway (may fail if no main)
+        candidate = await asyncio.to_thread(find_main_class_by_parsing, work_dir) or public_binary
+
+    if not candidate:
+        raise HTTPException(status_code=400, detail="No main(String[]) method found to run.")
+
+    if COMPILE_CACHE_ENABLED:
+        digest = await asyncio.to_thread(store_compiled, cache_entry, work_dir, candidate)
+        if digest:
+            remember_compiled(cache_key, digest)
+    return candidate, None
+
+def _locate_jdk() -> Tuple[str, str]:
     javac_path = shutil.which("javac")
     java_path = shutil.which("java")
-    javap_path = shutil.which("javap")
 
     if not javac_path or not java_path:
         raise HTTPException(
             status_code=500,
             detail="Java JDK not found. Ensure JDK is installed and in PATH."
         )
+    return javac_path, java_path
 
-    work_dir = tempfile.mkdtemp(prefix="java_run_")
-
-    try:
-        # File name must match any public top-level type (class/enum/record/interface)
-        public_kind, public_name = extract_public_type(request.code)
-        filename = f"{public_name or 'Main'}.java"
-        filepath = os.path.join(work_dir, filename)
-
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write(request.code)
-
-        # Compile
-        compile_cmd = [javac_path, "-encoding", "UTF-8", "-g:none", "-d", ".", filename]
-        compile_process = subprocess.run(
-            compile_cmd, capture_output=True, text=True, timeout=20, cwd=work_dir
-        )
+@app.post("/run-java")
+async def run_java_code(request: CodeRequest):
+    # Locate tools
+    javac_path, java_path = _locate_jdk()
 
-        if compile_process.returncode != 0:
-            return {
-                "ok": False,
-                "stage": "compile",
-                "stdout": compile_process.stdout,
-                "stderr": compile_process.stderr,
-                "output": compile_process.stderr,
-                "exit_code": compile_process.returncode,
-            }
-
-        # Always try to detect main via javap first (most reliable)
-        candidate: Optional[str] = None
-        mains: List[str] = []
-        if javap_path:
-            mains = find_main_classes_with_javap(work_dir, javap_path)
-
-        if mains:
-            candidate = mains[0]
-        else:
-            # Fallbacks if javap missing or didn't find anything
-            package_name = extract_package_name(request.code)
-            if public_name and code_mentions_main(request.code):
-                candidate = f"{package_name}.{public_name}" if package_name else public_name
-            elif public_name:
-                # Try public type anyway (may fail if no main)
-                candidate = f"{package_name}.{public_name}" if package_name else public_name
+    cache_key: Optional[str] = None
+    if not _NONDETERMINISTIC_RE.search(request.code):
+        cache_key = result_cache_key(request.code, request.input_data or "")
+        cached = await get_cached_result(cache_key)
+        if cached is not None:
+            return cached
 
-        if not candidate:
-            raise HTTPException(status_code=400, detail="No main(String[]) method found to run.")
+    work_dir: Optional[str] = None
+    run_reserved = False
+    try:
+        # Admitted to the run gate before compiling, so a full run gate can't waste a compile
+        RUN_SEM.reserve()
+        run_reserved = True
+        # Gate first, so a full server answers 429 instead of waiting on a workspace
+        async with COMPILE_SEM:
+            work_dir = await WORKSPACE_POOL.get()
+            candidate, failure = await prepare_java(javac_path, work_dir, request.code)
+        if failure:
+            return failure
 
         # Run
-        run_cmd = [java_path, "-Xmx256m", "-cp", ".", candidate]
-        run_process = subprocess.run(
-            run_cmd,
-            input=request.input_data or "",
-            capture_output=True,
-            text=True,
-            timeout=10,
-            cwd=work_dir
-        )
+        run_reserved = False
+        await RUN_SEM.acquire(reserved=True)
+        try:
+            run_code, run_stdout, run_stderr = await run_java(
+                java_path, work_dir, candidate, request.code, request.input_data or ""
+            )
+        finally:
+            RUN_SEM.release()
 
-        return {
+        result = {
             "ok": True,
             "stage": "run",
-            "stdout": run_process.stdout,
-            "stderr": run_process.stderr,
-            "output": run_process.stdout if run_process.stdout else run_process.stderr,
-            "exit_code": run_process.returncode,
+            "stdout": run_stdout,
+            "stderr": run_stderr,
+            "output": run_stdout if run_stdout else run_stderr,
+            "exit_code": run_code,
             "main_class": candidate,
         }
+        # A run killed by a signal (e.g. SIGXCPU/SIGXFSZ from the rlimits) depends on load, not the code
+        if cache_key and run_code >= 0:
+            await cache_result(cache_key, result)
+        return result
 
-    except subprocess.TimeoutExpired:
+    except HTTPException:
+        raise
+    except asyncio.TimeoutError:
         raise HTTPException(status_code=400, detail="Code execution timed out.")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        shutil.rmtree(work_dir, ignore_errors=True)
+        if run_reserved:
+            RUN_SEM.unreserve()
+        if work_dir:
+            await release_workspace(work_dir)
 
-@app.get("/java-env")
-def java_env():
-    javac_path = shutil.which("javac")
-    java_path = shutil.which("java")
-    out = {}
-    for name, path in [("javac", javac_path), ("java", java_path)]:
+def _sse(event: Optional[str], text: str) -> str:
+    lines = [f"event: {event}"] if event else []
+    lines += [f"data: {line}" for line in text.splitlines() or [""]]
+    return "\n".join(lines) + "\n\n"
+
+async def _feed_stdin(stream: asyncio.StreamWriter, data: bytes) -> None:
+    try:
+        stream.write(data)
+        await stream.drain()
+        stream.close()
+    except (BrokenPipeError, ConnectionResetError):
+        pass
+
+async def stream_java_output(
+    java_path: str, work_dir: str, main_class: str, input_data: str
+) -> AsyncIterator[str]:
+    """
+    Runs main_class in its own JVM and yields its combined stdout/stderr line by
+    line as server-sent events, then an `exit` event with the exit code.
+    Kills the JVM when closed; work_dir and the RUN_SEM slot are released by
+    the owning CleanupStreamingResponse.
+    """
+    proc: Optional[asyncio.subprocess.Process] = None
+    feeder: Optional[asyncio.Task] = None
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            java_path, *JAVA_RUN_FLAGS, *JAVA_CDS_FLAGS, "-cp", ".", main_class,
+            cwd=work_dir,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            preexec_fn=_sandbox_limits(RUN_TIMEOUT),
+            start_new_session=True,
+            limit=STREAM_OUTPUT_LIMIT,
+        )
+        # Feed stdin concurrently so a chatty program can't deadlock against us
+        feeder = asyncio.create_task(_feed_stdin(proc.stdin, input_data.encode("utf-8")))
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + RUN_TIMEOUT
+        streamed = 0
+        while True:
+            line = await asyncio.wait_for(proc.stdout.readline(), max(deadline - loop.time(), 0))
+            if not line:
+                break
+            streamed += len(line)
+            if streamed > STREAM_OUTPUT_LIMIT:
+                yield _sse("error", "Output limit exceeded.")
+                return
+            yield _sse(None, line.decode("utf-8", errors="replace"))
+
+        code = await asyncio.wait_for(proc.wait(), max(deadline - loop.time(), 0))
+        yield _sse("exit", str(code))
+    except asyncio.TimeoutError:
+        yield _sse("error", "Code execution timed out.")
+    except ValueError:
+        # A single line longer than the stream limit
+        yield _sse("error", "Output limit exceeded.")
+    finally:
+        if feeder:
+            feeder.cancel()
+        if proc and proc.returncode is None:
+            _kill_process_group(proc)
+            await proc.wait()
+
+class CleanupStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that closes its body and runs cleanup exactly once when
+    the response ends, even if the client left before the body ever started.
+    """
+
+    def __init__(self, content: AsyncIterator[str], cleanup: Callable[[], Awaitable[None]], **kwargs):
+        super().__init__(content, **kwargs)
+        self._cleanup: Optional[Callable[[], Awaitable[None]]] = cleanup
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            # Close the generator first so its process is dead before the workspace is reused
+            await self.body_iterator.aclose()
+            cleanup, self._cleanup = self._cleanup, None
+            if cleanup:
+                await cleanup()
+
+@app.post("/run-java/stream")
+async def stream_java_code(request: CodeRequest):
+    """
+    Like /run-java, but streams the program's output as server-sent events while
+    it runs. Compile failures are still returned as a JSON response.
+    """
+    javac_path, java_path = _locate_jdk()
+
+    work_dir: Optional[str] = None
+    streaming = False
+    run_reserved = False
+    try:
+        RUN_SEM.reserve()
+        run_reserved = True
+        async with COMPILE_SEM:
+            work_dir = await WORKSPACE_POOL.get()
+            candidate, failure = await prepare_java(javac_path, work_dir, request.code)
+        if failure:
+            return failure
+        # Reserved up front, taken here; the response releases it
+        run_reserved = False
+        await RUN_SEM.acquire(reserved=True)
+
+        async def release() -> None:
+            RUN_SEM.release()
+            await release_workspace(work_dir)
+
+        response = CleanupStreamingResponse(
+            stream_java_output(java_path, work_dir, candidate, request.input_data or ""),
+            cleanup=release,
+            media_type="text/event-stream",
+        )
+        streaming = True
+        return response
+
+    except HTTPException:
+        raise
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=400, detail="Code execution timed out.")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if run_reserved:
+            RUN_SEM.unreserve()
+        # Once streaming, the response owns the workspace
+        if work_dir and not streaming:
+            await release_workspace(work_dir)
+
+@app.on_event("startup")
+async def probe_java_env():
+    for name in ("javac", "java"):
+        path = shutil.which(name)
         if path:
             try:
-                p = subprocess.run([path, "-version"], capture_output=True, text=True)
-                out[name] = p.stdout.strip() or p.stderr.strip()
+                _, stdout, stderr = await run_process(
+                    [path, "-version"], cwd=tempfile.gettempdir(), timeout=30
+                )
+                _JAVA_ENV[name] = stdout.strip() or stderr.strip()
             except Exception as e:
-                out[name] = f"Error: {e}"
+                _JAVA_ENV[name] = f"Error: {e}"
         else:
-            out[name] = "NOT FOUND"
-    return out
\ No newline at end of file
+            _JAVA_ENV[name] = "NOT FOUND"
+
+@app.get("/java-env")
+def java_env():
+    return _JAVA_ENV
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=int(os.environ.get("PORT", "8000")),
+        loop="uvloop",
+        http="httptools",
+        # Each process has its own JVM worker pools sized to the CPU count,
+        # so more processes multiply JVMs rather than throughput
+        workers=int(os.environ.get("WEB_CONCURRENCY", "1")),
+    )